@@ -58,7 +58,7 @@ from conda_forge_tick.git_utils import (
 )
 from conda_forge_tick.utils import (
     setup_logger,
-    pluck,
+    pluck_many,
     load_graph,
     dump_graph,
     LazyJson,
@@ -452,6 +452,7 @@ def add_replacement_migrator(
     print(f"making replacement migrator for {old_pkg} -> {new_pkg}", flush=True)
     total_graph = copy.deepcopy(gx)
 
+    nodes_to_pluck = []
     for node, node_attrs in gx.nodes.items():
         requirements = node_attrs["payload"].get("requirements", {})
         rq = (
@@ -464,7 +465,8 @@ def add_replacement_migrator(
         old_pkg_c = pkgs.intersection(rq)
 
         if not old_pkg_c:
-            pluck(total_graph, node)
+            nodes_to_pluck.append(node)
+    pluck_many(total_graph, nodes_to_pluck)
 
     # post plucking we can have several strange cases, lets remove all selfloops
     total_graph.remove_edges_from(nx.selfloop_edges(total_graph))
@@ -714,9 +716,10 @@ def _outside_pin_range(pin_spec, current_pin, new_version):
 
 def create_migration_yaml_creator(migrators: MutableSequence[Migrator], gx: nx.DiGraph):
     cfp_gx = copy.deepcopy(gx)
-    for node in list(cfp_gx.nodes):
-        if node != "conda-forge-pinning":
-            pluck(cfp_gx, node)
+    pluck_many(
+        cfp_gx,
+        [node for node in cfp_gx.nodes if node != "conda-forge-pinning"],
+    )
 
     print("pinning migrations", flush=True)
     with indir(os.environ["CONDA_PREFIX"]):
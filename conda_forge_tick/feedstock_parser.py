@@ -26,6 +26,10 @@ from .utils import as_iterable, parse_meta_yaml
 LOGGER = logging.getLogger("conda_forge_tick.feedstock_parser")
 
 PIN_SEP_PAT = re.compile(r" |>|<|=|\[")
+# matches the package name at the start of a requirement, i.e. everything up
+# to the first PIN_SEP_PAT separator, without building the split list
+PIN_NAME_PAT = re.compile(r"[^ ><=\[]*")
+PIN_SEP_CHARS = frozenset(" ><=[")
 
 CONDA_FORGE_YML_KEYS_TO_KEEP = (
     "provider",
@@ -64,33 +68,67 @@ def _get_requirements(
         the set of recipe requirements
     """
     kw = dict(build=build, host=host, run=run)
-    reqs = _parse_requirements(meta_yaml.get("requirements", {}), **kw)
-    outputs_ = meta_yaml.get("outputs", []) or [] if outputs else []
-    for output in outputs_:
-        for req in _parse_requirements(output.get("requirements", {}) or {}, **kw):
-            reqs.add(req)
-    return reqs
+    sections = [meta_yaml.get("requirements", {})]
+    if outputs:
+        sections.extend(
+            output.get("requirements", {}) or {}
+            for output in meta_yaml.get("outputs", []) or []
+        )
+    return _parse_requirements_many(sections, **kw)
 
 
-def _parse_requirements(
+def _flatten_requirements(
     req: Union[None, typing.List[str], "RequirementsTypedDict"],
     build: bool = True,
     host: bool = True,
     run: bool = True,
-) -> typing.MutableSet["PackageName"]:
-    """Flatten a YAML requirements section into a list of names"""
+) -> typing.Iterator[str]:
+    """Iterate over the raw requirement strings of a YAML requirements section"""
     if not req:  # handle None as empty
-        return set()
+        return
     if isinstance(req, list):  # simple list goes to both host and run
-        reqlist = req if (host or run) else []
+        if host or run:
+            yield from req
     else:
-        _build = list(as_iterable(req.get("build", []) or [] if build else []))
-        _host = list(as_iterable(req.get("host", []) or [] if host else []))
-        _run = list(as_iterable(req.get("run", []) or [] if run else []))
-        reqlist = _build + _host + _run
+        if build:
+            yield from as_iterable(req.get("build", []) or [])
+        if host:
+            yield from as_iterable(req.get("host", []) or [])
+        if run:
+            yield from as_iterable(req.get("run", []) or [])
+
+
+def _parse_requirements(
+    req: Union[None, typing.List[str], "RequirementsTypedDict"],
+    build: bool = True,
+    host: bool = True,
+    run: bool = True,
+) -> typing.MutableSet["PackageName"]:
+    """Flatten a YAML requirements section into a list of names"""
+    return _parse_requirements_many([req], build=build, host=host, run=run)
+
+
+def _parse_requirements_many(
+    reqs: typing.Iterable[Union[None, typing.List[str], "RequirementsTypedDict"]],
+    build: bool = True,
+    host: bool = True,
+    run: bool = True,
+) -> typing.MutableSet["PackageName"]:
+    """Flatten several YAML requirements sections into a single set of names"""
+    return {
+        _strip_pin(x)
+        for req in reqs
+        for x in _flatten_requirements(req, build=build, host=host, run=run)
+        if x is not None
+    }
+
 
-    packages = (PIN_SEP_PAT.split(x)[0].lower() for x in reqlist if x is not None)
-    return {typing.cast("PackageName", pkg) for pkg in packages}
+def _strip_pin(req: str) -> "PackageName":
+    """Get the lowercased package name from a requirement string."""
+    # most requirements carry no pin at all, so skip the regex for those
+    if PIN_SEP_CHARS.isdisjoint(req):
+        return typing.cast("PackageName", req.lower())
+    return typing.cast("PackageName", PIN_NAME_PAT.match(req).group(0).lower())
 
 
 def _extract_requirements(meta_yaml):
@@ -99,24 +137,21 @@ def _extract_requirements(meta_yaml):
     for block in [meta_yaml] + meta_yaml.get("outputs", []) or []:
         req: "RequirementsTypedDict" = block.get("requirements", {}) or {}
         if isinstance(req, list):
-            requirements_dict["run"].update(set(req))
+            requirements_dict["run"].update(req)
             continue
         for section in ["build", "host", "run"]:
-            requirements_dict[section].update(
-                list(as_iterable(req.get(section, []) or [])),
-            )
+            requirements_dict[section].update(as_iterable(req.get(section, []) or []))
         test: "TestTypedDict" = block.get("test", {})
-        requirements_dict["test"].update(test.get("requirements", []) or [])
-        requirements_dict["test"].update(test.get("requires", []) or [])
+        requirements_dict["test"].update(
+            test.get("requirements", []) or [],
+            test.get("requires", []) or [],
+        )
         run_exports = (block.get("build", {}) or {}).get("run_exports", {})
         if isinstance(run_exports, dict) and run_exports.get("strong"):
             strong_exports = True
     for k in list(requirements_dict.keys()):
         requirements_dict[k] = {v for v in requirements_dict[k] if v}
-    req_no_pins = {
-        k: {PIN_SEP_PAT.split(x)[0].lower() for x in v}
-        for k, v in dict(requirements_dict).items()
-    }
+    req_no_pins = {k: {_strip_pin(x) for x in v} for k, v in requirements_dict.items()}
     return dict(requirements_dict), req_no_pins, strong_exports
 
 
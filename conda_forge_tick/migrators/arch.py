@@ -7,7 +7,7 @@ from ruamel.yaml import safe_load, safe_dump
 
 from conda_forge_tick.contexts import FeedstockContext
 from conda_forge_tick.migrators.core import _sanitized_muids, GraphMigrator
-from conda_forge_tick.utils import frozen_to_json_friendly, pluck, as_iterable
+from conda_forge_tick.utils import frozen_to_json_friendly, pluck_many, as_iterable
 from conda_forge_tick.xonsh_utils import indir
 from conda_forge_tick.make_graph import get_deps_from_outputs_lut
 from .migration_yaml import all_noarch
@@ -84,15 +84,20 @@ class ArchRebuild(GraphMigrator):
             self.graph.remove_nodes_from([n for n in self.graph if n not in packages])
 
         # filter out stub packages and ignored packages
-        for node, attrs in list(self.graph.nodes("payload")):
-            if (
-                node.endswith("_stub")
-                or (node.startswith("m2-"))
-                or (node.startswith("m2w64-"))
-                or (node in self.ignored_packages)
-                or all_noarch(attrs)
-            ):
-                pluck(self.graph, node)
+        pluck_many(
+            self.graph,
+            [
+                node
+                for node, attrs in self.graph.nodes("payload")
+                if (
+                    node.endswith("_stub")
+                    or (node.startswith("m2-"))
+                    or (node.startswith("m2w64-"))
+                    or (node in self.ignored_packages)
+                    or all_noarch(attrs)
+                )
+            ],
+        )
         self.graph.remove_edges_from(nx.selfloop_edges(self.graph))
 
     def filter(self, attrs: "AttrsTypedDict", not_bad_str_start: str = "") -> bool:
@@ -231,16 +236,21 @@ class OSXArm(GraphMigrator):
             self.graph.remove_nodes_from([n for n in self.graph if n not in packages])
 
         # filter out stub packages and ignored packages
-        for node, attrs in list(self.graph.nodes("payload")):
-            if (
-                not attrs
-                or node.endswith("_stub")
-                or (node.startswith("m2-"))
-                or (node.startswith("m2w64-"))
-                or (node in self.ignored_packages)
-                or all_noarch(attrs)
-            ):
-                pluck(self.graph, node)
+        pluck_many(
+            self.graph,
+            [
+                node
+                for node, attrs in self.graph.nodes("payload")
+                if (
+                    not attrs
+                    or node.endswith("_stub")
+                    or (node.startswith("m2-"))
+                    or (node.startswith("m2w64-"))
+                    or (node in self.ignored_packages)
+                    or all_noarch(attrs)
+                )
+            ],
+        )
 
         self.graph.remove_edges_from(nx.selfloop_edges(self.graph))
 
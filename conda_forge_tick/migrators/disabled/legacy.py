@@ -4,7 +4,7 @@ import os
 import re
 from itertools import chain
 from textwrap import dedent
-from typing import Any, Optional, Set, List
+from typing import Any, Optional, Set, List, Union
 import tempfile
 
 import networkx as nx
@@ -486,7 +486,7 @@ class Pinning(Migrator):
         removals: Optional[Set["PackageName"]] = None,
     ):
         super().__init__(pr_limit)
-        self.removals: Set
+        self.removals: Union[Set, UniversalSet]
         if removals is None:
             self.removals = UniversalSet()
         else:
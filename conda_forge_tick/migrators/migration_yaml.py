@@ -14,7 +14,7 @@ import ruamel.yaml as yaml
 from conda_forge_tick.contexts import FeedstockContext
 from conda_forge_tick.migrators.core import GraphMigrator, MiniMigrator, Migrator
 from conda_forge_tick.xonsh_utils import indir
-from conda_forge_tick.utils import eval_cmd, pluck
+from conda_forge_tick.utils import eval_cmd, pluck_many
 from conda_forge_tick.make_graph import get_deps_from_outputs_lut
 from conda_forge_tick.feedstock_parser import PIN_SEP_PAT
 
@@ -547,11 +547,16 @@ def create_rebuild_graph(
     included_nodes.add("conda-forge-pinning")  # it does not get added above
 
     # finally remove all nodes that should not be built from the graph
-    for node in list(total_graph.nodes):
-        # if there isn't a strict dependency or if the feedstock is excluded,
-        # remove it while retaining the edges to its parents and children
-        if (node not in included_nodes) or (node in excluded_feedstocks):
-            pluck(total_graph, node)
+    # if there isn't a strict dependency or if the feedstock is excluded,
+    # remove it while retaining the edges to its parents and children
+    pluck_many(
+        total_graph,
+        [
+            node
+            for node in total_graph.nodes
+            if (node not in included_nodes) or (node in excluded_feedstocks)
+        ],
+    )
 
     # post plucking we can have several strange cases, lets remove all selfloops
     total_graph.remove_edges_from(nx.selfloop_edges(total_graph))
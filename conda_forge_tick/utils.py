@@ -1,11 +1,12 @@
 import datetime
+import functools
+import hashlib
 import typing
 import copy
 import pprint
 from collections.abc import Callable
 from collections import defaultdict
 import contextlib
-import itertools
 import rapidjson as json
 import logging
 import tempfile
@@ -27,6 +28,17 @@ import boto3
 
 import networkx as nx
 
+try:
+    import conda_build.api
+    import conda_build.environ
+    import conda_build.source
+    from conda_build.config import Config
+    from conda_build.metadata import parse, MetaData
+    from conda_build.variants import explode_variants
+except ImportError:
+    # conda-build is only needed to parse recipes
+    conda_build = Config = parse = MetaData = explode_variants = None
+
 from . import sensitive_env
 
 if typing.TYPE_CHECKING:
@@ -36,6 +48,12 @@ if typing.TYPE_CHECKING:
 
 logger = logging.getLogger("conda_forge_tick.utils")
 
+
+def _require_conda_build() -> None:
+    if conda_build is None:
+        raise ImportError("conda-build is required to parse and render recipes")
+
+
 T = typing.TypeVar("T")
 TD = typing.TypeVar("TD", bound=dict, covariant=True)
 
@@ -86,16 +104,13 @@ def render_meta_yaml(text: str, for_pinning=False, **kwargs) -> str:
 
     """
 
-    cfg = dict(**kwargs)
-
-    env = jinja2.Environment(undefined=NullUndefined)
-    if for_pinning:
-        cfg.update(**CB_CONFIG_PINNING)
-    else:
-        cfg.update(**CB_CONFIG)
+    base_cfg = CB_CONFIG_PINNING if for_pinning else CB_CONFIG
+    # the stub context is constant, so only build a merged copy when there
+    # are extra variables to layer underneath it
+    cfg = {**kwargs, **base_cfg} if kwargs else base_cfg
 
     try:
-        return env.from_string(text).render(**cfg)
+        return _compile_template(text).render(cfg)
     except Exception:
         logger.debug("template: %s", text)
         logger.debug("context:\n%s", pprint.pformat(cfg))
@@ -152,6 +167,40 @@ def parse_meta_yaml(
         raise RuntimeError("cond build error: %s" % str(e))
 
 
+def parse_meta_yaml_many(
+    texts: Iterable[str],
+    max_workers: Optional[int] = None,
+    chunksize: int = 32,
+    **kwargs: Any,
+) -> typing.List["MetaYamlTypedDict"]:
+    """Parse several meta.yaml files in parallel worker processes.
+
+    Parameters
+    ----------
+    texts : iterable of str
+        The raw texts of the conda-forge feedstock meta.yaml files
+    max_workers : int, optional
+        The number of worker processes. Defaults to the number of CPUs.
+    chunksize : int, optional
+        The number of texts sent to a worker at a time. Default is 32.
+    **kwargs : glob for extra keyword arguments
+        These are passed to `parse_meta_yaml` for every text.
+
+    Returns
+    -------
+    list of dict :
+        The parsed YAML dicts, in the same order as `texts`.
+    """
+    with executor("process", max_workers=max_workers) as pool:
+        return list(
+            pool.map(
+                functools.partial(parse_meta_yaml, **kwargs),
+                texts,
+                chunksize=chunksize,
+            ),
+        )
+
+
 def _parse_meta_yaml_impl(
     text: str,
     for_pinning=False,
@@ -162,12 +211,7 @@ def _parse_meta_yaml_impl(
     log_debug=False,
     **kwargs: Any,
 ) -> "MetaYamlTypedDict":
-    from conda_build.config import Config
-    from conda_build.metadata import parse, MetaData
-    import conda_build.api
-    import conda_build.environ
-    from conda_build.variants import explode_variants
-
+    _require_conda_build()
     if (
         recipe_dir is not None
         and cbc_path is not None
@@ -263,26 +307,29 @@ def eval_cmd(cmd, **kwargs):
     return c.stdout.decode("utf-8")
 
 
-class UniversalSet(Set):
-    """The universal set, or identity of the set intersection operation."""
+class UniversalSet:
+    """The universal set, or identity of the set intersection operation.
 
-    def __and__(self, other: Set) -> Set:
-        return other
+    This only implements intersection and membership. It does not derive from
+    ``collections.abc.Set``, whose mixin comparisons and set operations would
+    try to iterate over every element.
+    """
+
+    __slots__ = ()
 
-    def __rand__(self, other: Set) -> Set:
+    def __and__(self, other: T) -> T:
         return other
 
+    __rand__ = __and__
+
     def __contains__(self, item: Any) -> bool:
         return True
 
     def __iter__(self) -> typing.Iterator[Any]:
-        return self
-
-    def __next__(self) -> typing.NoReturn:
-        raise StopIteration
+        return iter(())
 
     def __len__(self) -> int:
-        return float("inf")
+        raise TypeError("the universal set has no finite length")
 
 
 class NullUndefined(jinja2.Undefined):
@@ -296,6 +343,67 @@ class NullUndefined(jinja2.Undefined):
         return f'{self}["{name}"]'
 
 
+@functools.lru_cache(maxsize=None)
+def _get_jinja_bytecode_cache() -> Optional[jinja2.BytecodeCache]:
+    """Get the on-disk bytecode cache for compiled templates, if enabled.
+
+    The cache is off by default since it is never pruned and every new
+    meta.yaml text adds a file to it. Set ``CONDA_FORGE_TICK_JINJA_CACHE_DIR``
+    to a directory to turn it on; the directory is created on first use.
+    """
+    cache_dir = os.environ.get("CONDA_FORGE_TICK_JINJA_CACHE_DIR")
+    if not cache_dir:
+        return None
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+    except OSError:
+        return None
+    return jinja2.FileSystemBytecodeCache(directory=cache_dir)
+
+
+# templates only ever come from strings, never from a loader, so there is
+# nothing to auto reload and the environment's own template cache is never hit;
+# compiled templates are cached by _compile_template and the bytecode cache
+_JINJA_ENV = jinja2.Environment(
+    undefined=NullUndefined,
+    auto_reload=False,
+    cache_size=0,
+)
+
+
+# keyed on the text itself: str hashes are cached on the object and a digest
+# would cost a full pass over the text on every lookup anyway
+@functools.lru_cache(maxsize=4096)
+def _compile_template(text: str) -> jinja2.Template:
+    """Compile (and memoize) a template from the shared Jinja2 environment.
+
+    When the on-disk bytecode cache is enabled, compiled code is also kept
+    there, keyed by a hash of the template text, so it survives across
+    processes. The template is then named by that hex digest, which is what
+    Jinja2 error messages show instead of ``<template>``.
+    """
+    bcc = _get_jinja_bytecode_cache()
+    if bcc is None:
+        return _JINJA_ENV.from_string(text)
+
+    # this mirrors jinja2.BaseLoader.load, which from_string bypasses
+    name = hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+    bucket = bcc.get_bucket(_JINJA_ENV, name, None, text)
+    code = bucket.code
+    if code is None:
+        code = _JINJA_ENV.compile(text, name)
+        bucket.code = code
+        try:
+            bcc.set_bucket(bucket)
+        except OSError as e:
+            logger.debug("could not write jinja2 bytecode cache: %s", e)
+    return _JINJA_ENV.template_class.from_code(
+        _JINJA_ENV,
+        code,
+        _JINJA_ENV.make_globals(None),
+    )
+
+
 class LazyJson(MutableMapping):
     """Lazy load a dict from a json file and save it when updated"""
 
@@ -304,9 +412,12 @@ class LazyJson(MutableMapping):
         # If the file doesn't exist create an empty file
         if not os.path.exists(self.file_name):
             os.makedirs(os.path.split(self.file_name)[0], exist_ok=True)
-            with open(self.file_name, "w") as f:
+            with open(self.file_name, "w", encoding="utf-8") as f:
                 dump({}, f)
         self._data: Optional[dict] = None
+        # writes are deferred while inside a ``with`` block and flushed on exit
+        self._dirty = False
+        self._in_context = 0
 
     @property
     def data(self):
@@ -316,7 +427,23 @@ class LazyJson(MutableMapping):
     def clear(self):
         self._load()
         self._data.clear()
-        self._dump()
+        self._mark_dirty()
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        # batch the per-key writes of MutableMapping.update into a single dump
+        self._in_context += 1
+        try:
+            super().update(*args, **kwargs)
+        finally:
+            self._in_context -= 1
+            # write whatever was applied, even if a later key failed
+            if not self._in_context:
+                self.flush()
+
+    def flush(self) -> None:
+        """Write any pending changes to disk."""
+        if self._dirty:
+            self._dump()
 
     def __len__(self) -> int:
         self._load()
@@ -332,12 +459,12 @@ class LazyJson(MutableMapping):
         self._load()
         assert self._data is not None
         del self._data[v]
-        self._dump()
+        self._mark_dirty()
 
     def _load(self) -> None:
         if self._data is None:
             try:
-                with open(self.file_name) as f:
+                with open(self.file_name, encoding="utf-8") as f:
                     self._data = load(f)
             except FileNotFoundError:
                 print(os.getcwd())
@@ -346,8 +473,9 @@ class LazyJson(MutableMapping):
 
     def _dump(self, purge=False) -> None:
         self._load()
-        with open(self.file_name, "w") as f:
+        with open(self.file_name, "w", encoding="utf-8") as f:
             dump(self._data, f)
+        self._dirty = False
         if purge:
             # this evicts the josn from memory and trades i/o for mem
             # the bot uses too much mem if we don't do this
@@ -362,18 +490,34 @@ class LazyJson(MutableMapping):
         self._load()
         assert self._data is not None
         self._data[key] = value
-        self._dump()
+        self._mark_dirty()
+
+    def _mark_dirty(self) -> None:
+        self._dirty = True
+        if not self._in_context:
+            self._dump()
 
     def __getstate__(self) -> dict:
-        state = self.__dict__.copy()
-        state["_data"] = None
-        return state
+        # only the file name is pickled, the data is reloaded lazily from disk
+        return {"file_name": self.file_name}
+
+    def __setstate__(self, state: dict) -> None:
+        # restore without __init__, which would create the file if missing
+        self.file_name = state["file_name"]
+        self._data = None
+        self._dirty = False
+        self._in_context = 0
 
     def __enter__(self) -> "LazyJson":
+        self._in_context += 1
         return self
 
     def __exit__(self, *args: Any) -> Any:
-        self._dump(purge=True)
+        self._in_context -= 1
+        if not self._in_context:
+            # nested values may have been mutated in place without going
+            # through __setitem__, so always write on the outermost exit
+            self._dump(purge=True)
 
 
 def setup_logger(logger: logging.Logger, level: Optional[str] = "INFO") -> None:
@@ -403,14 +547,34 @@ def pluck(G: nx.DiGraph, node_id: Any) -> None:
 
     """
     if node_id in G.nodes:
-        new_edges = list(
-            itertools.product(
-                {_in for (_in, _) in G.in_edges(node_id)} - {node_id},
-                {_out for (_, _out) in G.out_edges(node_id)} - {node_id},
-            ),
-        )
+        preds = set(G.predecessors(node_id))
+        preds.discard(node_id)
+        succs = set(G.successors(node_id))
+        succs.discard(node_id)
         G.remove_node(node_id)
-        G.add_edges_from(new_edges)
+        G.add_edges_from(
+            (_in, _out) for _in in preds for _out in succs if not G.has_edge(_in, _out)
+        )
+
+
+def pluck_many(G: nx.DiGraph, node_ids: Iterable[Any]) -> None:
+    """Remove several nodes from a graph preserving structure.
+
+    The nodes are plucked in order of increasing ``in_degree * out_degree`` so that
+    hubs are removed last, once their neighborhoods have shrunk. The resulting
+    connectivity is the same as plucking the nodes one by one in any order. This
+    function operates in-place.
+
+    Parameters
+    ----------
+    G : networkx.Graph
+    node_ids : iterable of hashable
+
+    """
+    nodes = [node_id for node_id in node_ids if node_id in G.nodes]
+    nodes.sort(key=lambda n: G.in_degree(n) * G.out_degree(n))
+    for node_id in nodes:
+        pluck(G, node_id)
 
 
 @contextlib.contextmanager
@@ -461,48 +625,31 @@ def object_hook(dct: dict) -> Union[LazyJson, Set, dict]:
     return dct
 
 
-def dumps(
-    obj: Any,
-    sort_keys: bool = True,
-    separators: Any = (",", ":"),
-    default: "Callable[[Any], Any]" = default,
-    **kwargs: Any,
-) -> str:
-    """Returns a JSON string from a Python object."""
-    return json.dumps(
-        obj,
-        sort_keys=sort_keys,
-        # separators=separators,
-        default=default,
-        indent=1,
-        **kwargs,
-    )
+_DEFAULT_OBJECT_HOOK = object_hook
+# the keys the default object_hook reacts to; payloads without any of them
+# can be decoded without calling back into python for every object
+_OBJECT_HOOK_MARKERS = ("__lazy_json__", "__set__")
+_OBJECT_HOOK_MARKERS_BYTES = tuple(m.encode() for m in _OBJECT_HOOK_MARKERS)
 
 
-def dump(
-    obj: Any,
-    fp: IO[str],
-    sort_keys: bool = True,
-    separators: Any = (",", ":"),
-    default: "Callable[[Any], Any]" = default,
-    **kwargs: Any,
-) -> None:
-    """Returns a JSON string from a Python object."""
-    return json.dump(
-        obj,
-        fp,
-        sort_keys=sort_keys,
-        # separators=separators,
-        default=default,
-        indent=1,
-        **kwargs,
-    )
+def _has_object_hook_markers(s: Union[str, bytes]) -> bool:
+    if isinstance(s, (bytes, bytearray)):
+        return any(m in s for m in _OBJECT_HOOK_MARKERS_BYTES)
+    return any(m in s for m in _OBJECT_HOOK_MARKERS)
+
+
+# bound once so every call dispatches straight to rapidjson; obj (and fp for
+# dump) are positional and sort_keys/default can still be overridden by keyword
+dumps = functools.partial(json.dumps, sort_keys=True, default=default, indent=1)
+dump = functools.partial(json.dump, sort_keys=True, default=default, indent=1)
 
 
 def loads(
     s: str, object_hook: "Callable[[dict], Any]" = object_hook, **kwargs: Any
 ) -> dict:
     """Loads a string as JSON, with appropriate object hooks"""
+    if object_hook is _DEFAULT_OBJECT_HOOK and not _has_object_hook_markers(s):
+        object_hook = None
     return json.loads(s, object_hook=object_hook, **kwargs)
 
 
@@ -512,7 +659,7 @@ def load(
     **kwargs: Any,
 ) -> dict:
     """Loads a file object as JSON, with appropriate object hooks."""
-    return json.load(fp, object_hook=object_hook, **kwargs)
+    return loads(fp.read(), object_hook=object_hook, **kwargs)
 
 
 def dump_graph_json(gx: nx.DiGraph, filename: str = "graph.json") -> None:
@@ -524,6 +671,47 @@ def dump_graph_json(gx: nx.DiGraph, filename: str = "graph.json") -> None:
         dump(nld, f)
 
 
+# compact, single line JSON for streaming one graph element at a time; this
+# is bound once so each element goes straight to the encoder
+_dumps_line = functools.partial(json.dumps, sort_keys=True, default=default)
+
+
+def dump_graph_stream(gx: nx.DiGraph, filename: str = "graph.json") -> None:
+    """Write the graph as node-link JSON one node and one link at a time.
+
+    The output loads with ``load_graph`` just like ``dump_graph_json``, but the
+    full ``nx.node_link_data`` dict is never built in memory. Each node and link
+    is written on its own line, while ``"graph"`` (which holds the large
+    ``outputs_lut``) is indented exactly as ``dump_graph_json`` writes it so
+    that changes to it stay line by line diffs.
+    """
+    if gx.is_multigraph():
+        edges = sorted(gx.edges(keys=True, data=True), key=lambda e: f"{e[0]}{e[1]}")
+        links = ({**d, "source": u, "target": v, "key": k} for u, v, k, d in edges)
+    else:
+        edges = sorted(gx.edges(data=True), key=lambda e: f"{e[0]}{e[1]}")
+        links = ({**d, "source": u, "target": v} for u, v, d in edges)
+    nodes = ({**d, "id": n} for n, d in gx.nodes(data=True))
+
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write("{\n")
+        f.write(f' "directed": {_dumps_line(gx.is_directed())},\n')
+        # json strings never hold raw newlines, so this only shifts the
+        # indented document one level in
+        f.write(' "graph": ' + dumps(gx.graph).replace("\n", "\n ") + ",\n")
+        f.write(' "links": [')
+        for i, link in enumerate(links):
+            f.write(",\n  " if i else "\n  ")
+            f.write(_dumps_line(link))
+        f.write("\n ],\n")
+        f.write(f' "multigraph": {_dumps_line(gx.is_multigraph())},\n')
+        f.write(' "nodes": [')
+        for i, node in enumerate(nodes):
+            f.write(",\n  " if i else "\n  ")
+            f.write(_dumps_line(node))
+        f.write("\n ]\n}")
+
+
 def dump_graph_dynamo(
     gx: nx.DiGraph,
     tablename: str = "graph",
@@ -550,7 +738,7 @@ def dump_graph(
     tablename: str = "graph",
     region: str = "us-east-2",
 ) -> None:
-    dump_graph_json(gx, filename)
+    dump_graph_stream(gx, filename)
     # dump_graph_dynamo(gx, tablename, region)
 
 
@@ -591,7 +779,7 @@ def frozen_to_json_friendly(fz: Any, pr: Optional[LazyJson] = None) -> "JsonFrie
 def frozen_to_json_friendly(fz, pr: Optional[LazyJson] = None):
     if fz is None:
         return None
-    keys = sorted(list(fz.keys()))
+    keys = sorted(fz)
     d = {"keys": keys, "data": dict(fz)}
     if pr:
         d["PR"] = pr
@@ -668,12 +856,9 @@ def as_iterable(iterable_or_scalar):
 
 def _get_source_code(recipe_dir):
     try:
-        from conda_build.api import render
-        from conda_build.config import Config
-        from conda_build.source import provide
-
+        _require_conda_build()
         # Use conda build to do all the downloading/extracting bits
-        md = render(
+        md = conda_build.api.render(
             recipe_dir,
             config=Config(**CB_CONFIG),
             finalize=False,
@@ -683,7 +868,7 @@ def _get_source_code(recipe_dir):
             return None
         md = md[0][0]
         # provide source dir
-        return provide(md)
+        return conda_build.source.provide(md)
     except (SystemExit, Exception) as e:
         raise RuntimeError("conda build src exception:" + str(e))
 
@@ -3,6 +3,9 @@ import os
 import pytest
 from conda_forge_tick import global_sensitive_env
 
+# never leave compiled meta.yaml templates behind in a developer's cache
+os.environ.pop("CONDA_FORGE_TICK_JINJA_CACHE_DIR", None)
+
 
 @pytest.fixture
 def env_setup():
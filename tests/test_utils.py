@@ -1,8 +1,31 @@
+import contextlib
+import copy
+import io
 import os
 import json
 import pickle
+from concurrent.futures import ThreadPoolExecutor
 
-from conda_forge_tick.utils import LazyJson, dumps
+import networkx as nx
+import pytest
+import rapidjson
+
+import conda_forge_tick.utils
+
+from conda_forge_tick.utils import (
+    LazyJson,
+    UniversalSet,
+    _compile_template,
+    _get_jinja_bytecode_cache,
+    dump,
+    dump_graph_stream,
+    dumps,
+    loads,
+    parse_meta_yaml_many,
+    pluck,
+    pluck_many,
+    render_meta_yaml,
+)
 
 
 def test_lazy_json(tmpdir):
@@ -49,3 +72,324 @@ def test_lazy_json(tmpdir):
     lj.clear()
     with open(f) as ff:
         assert ff.read() == dumps({})
+
+
+def test_lazy_json_batches_writes(tmpdir):
+    f = os.path.join(tmpdir, "hi.json")
+    lj = LazyJson(f)
+
+    with lj as attrs:
+        attrs["hi"] = "world"
+        attrs["bye"] = "moon"
+        with open(f) as ff:
+            assert ff.read() == json.dumps({})
+    with open(f) as ff:
+        assert ff.read() == dumps({"bye": "moon", "hi": "world"})
+
+    lj.update(hi="globe", bye="sun")
+    assert not lj._dirty
+    with open(f) as ff:
+        assert ff.read() == dumps({"bye": "sun", "hi": "globe"})
+
+    del lj["bye"]
+    with open(f) as ff:
+        assert ff.read() == dumps({"hi": "globe"})
+
+
+def test_json_round_trip(tmpdir):
+    f = os.path.join(tmpdir, "hi.json")
+    lj = LazyJson(f)
+    lj["hi"] = "world"
+    data = {"b": {"c", "a"}, "a": [lj, {"d": {"e"}}]}
+
+    s = dumps(data)
+    assert s.index('"a"') < s.index('"b"')
+
+    out = loads(s)
+    assert out["b"] == {"a", "c"}
+    assert isinstance(out["a"][0], LazyJson)
+    assert out["a"][0].file_name == f
+    assert out["a"][0]["hi"] == "world"
+    assert out["a"][1] == {"d": {"e"}}
+
+
+def test_pluck_many():
+    gx = nx.DiGraph()
+    gx.add_edges_from(
+        [("a", "hub"), ("b", "hub"), ("hub", "c"), ("hub", "stub"), ("stub", "d")],
+    )
+    expected = gx.copy()
+    pluck(expected, "stub")
+    pluck(expected, "hub")
+
+    pluck_many(gx, ["hub", "stub", "not-a-node"])
+    assert set(gx.nodes) == {"a", "b", "c", "d"}
+    assert set(gx.edges) == set(expected.edges)
+    assert set(gx.edges) == {
+        ("a", "c"),
+        ("a", "d"),
+        ("b", "c"),
+        ("b", "d"),
+    }
+
+
+def test_loads_skips_object_hook_without_markers():
+    calls = []
+
+    def hook(dct):
+        calls.append(dct)
+        return dct
+
+    assert loads('{"a": {"b": [1, {}]}}') == {"a": {"b": [1, {}]}}
+    assert loads(b'{"b": {"__set__": true, "elements": [1]}}') == {"b": {1}}
+    # custom hooks are always honored
+    assert loads('{"a": {}}', object_hook=hook) == {"a": {}}
+    assert calls == [{}, {"a": {}}]
+
+
+def test_dump_graph_stream(tmpdir):
+    f = os.path.join(tmpdir, "hi.json")
+    lj = LazyJson(f)
+    gx = nx.DiGraph(outputs_lut={"a": {"b"}})
+    gx.add_node("a", payload=lj)
+    gx.add_node("b", payload=lj)
+    gx.add_node("c", payload=lj)
+    gx.add_edges_from([("b", "c"), ("a", "c")])
+
+    fn = os.path.join(tmpdir, "graph.json")
+    dump_graph_stream(gx, fn)
+    with open(fn) as fp:
+        nld = loads(fp.read())
+
+    assert nld["directed"] is True
+    assert nld["multigraph"] is False
+    assert nld["graph"] == {"outputs_lut": {"a": {"b"}}}
+    assert [n["id"] for n in nld["nodes"]] == ["a", "b", "c"]
+    assert nld["nodes"][0]["payload"].file_name == f
+    assert nld["links"] == [
+        {"source": "a", "target": "c"},
+        {"source": "b", "target": "c"},
+    ]
+
+
+def test_dump_graph_stream_layout(tmpdir):
+    f = os.path.join(tmpdir, "hi.json")
+    lj = LazyJson(f)
+    gx = nx.DiGraph(outputs_lut={"a": {"b"}, "c": {"d"}})
+    gx.add_node("a", payload=lj)
+    gx.add_node("b", payload=lj)
+    gx.add_edge("a", "b")
+
+    fn = os.path.join(tmpdir, "graph.json")
+    dump_graph_stream(gx, fn)
+    with open(fn) as fp:
+        text = fp.read()
+
+    # the graph attributes are indented one entry per line so they diff well,
+    # while every link and node sits on a single line
+    payload = '{"__lazy_json__":' + rapidjson.dumps(f) + "}"
+    assert text.splitlines() == [
+        "{",
+        ' "directed": true,',
+        ' "graph": {',
+        '  "outputs_lut": {',
+        '   "a": {',
+        '    "__set__": true,',
+        '    "elements": [',
+        '     "b"',
+        "    ]",
+        "   },",
+        '   "c": {',
+        '    "__set__": true,',
+        '    "elements": [',
+        '     "d"',
+        "    ]",
+        "   }",
+        "  }",
+        " },",
+        ' "links": [',
+        '  {"source":"a","target":"b"}',
+        " ],",
+        ' "multigraph": false,',
+        ' "nodes": [',
+        f'  {{"id":"a","payload":{payload}}},',
+        f'  {{"id":"b","payload":{payload}}}',
+        " ]",
+        "}",
+    ]
+
+
+def test_lazy_json_instances_are_isolated(tmpdir):
+    f = os.path.join(tmpdir, "hi.json")
+    lj = LazyJson(f)
+    lj.update({"k": "v", "n": {"x": 1}})
+
+    # deferred writes are not visible to other instances until flushed
+    with lj as attrs:
+        attrs["k"] = "changed"
+        assert LazyJson(f)["k"] == "v"
+    assert LazyJson(f)["k"] == "changed"
+
+    # nor are in place mutations that were never written
+    lj["n"]["x"] = 2
+    assert LazyJson(f)["n"] == {"x": 1}
+
+    lj2 = copy.deepcopy(lj)
+    assert lj2.file_name == f
+    assert lj2.data is not lj.data
+    assert lj2["n"] == {"x": 1}
+    lj2["n"]["x"] = 3
+    assert lj["n"] == {"x": 2}
+
+
+def test_universal_set():
+    us = UniversalSet()
+    assert {"a", "b"} & us == {"a", "b"}
+    assert us & {"a"} == {"a"}
+    assert "anything" in us
+    assert list(us) == []
+
+
+def test_lazy_json_update_flushes_on_error(tmpdir):
+    f = os.path.join(tmpdir, "hi.json")
+    lj = LazyJson(f)
+
+    def _items():
+        yield "hi", "world"
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        lj.update(_items())
+    assert not lj._dirty
+    with open(f) as ff:
+        assert ff.read() == dumps({"hi": "world"})
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {"name": "héllo 🎉", "n": [1, 2.5, None]},
+        {"big": 2**70, "neg": -(2**65), "max": 2**63 - 1},
+        {"nan": float("nan"), "inf": float("inf"), "ninf": float("-inf")},
+    ],
+)
+def test_json_edge_values_round_trip(data, tmpdir):
+    s = dumps(data)
+    assert s == rapidjson.dumps(data, sort_keys=True, indent=1)
+    assert s.isascii()
+    loaded = loads(s)
+
+    expected = repr(dict(sorted(data.items())))
+    assert repr(loaded) == expected
+    for k, v in loaded.items():
+        assert type(v) is type(data[k])
+
+    f = os.path.join(tmpdir, "hi.json")
+    lj = LazyJson(f)
+    lj.update(data)
+    with open(f, encoding="utf-8") as fp:
+        assert repr(loads(fp.read())) == expected
+
+
+@pytest.mark.parametrize("enabled", [False, True])
+def test_jinja_bytecode_cache(enabled, tmpdir, monkeypatch):
+    cache_dir = os.path.join(tmpdir, "jinja")
+    if enabled:
+        monkeypatch.setenv("CONDA_FORGE_TICK_JINJA_CACHE_DIR", cache_dir)
+    _get_jinja_bytecode_cache.cache_clear()
+    _compile_template.cache_clear()
+    try:
+        assert not os.path.exists(cache_dir)
+        text = '{% set v = "1.0" %}version: {{ v }} {{ compiler("c") }}'
+        assert render_meta_yaml(text) == "version: 1.0 c_compiler_stub"
+        if enabled:
+            assert len(os.listdir(cache_dir)) == 1
+            # a new process would load the compiled code from disk
+            _compile_template.cache_clear()
+            assert render_meta_yaml(text) == "version: 1.0 c_compiler_stub"
+        else:
+            assert not os.path.exists(cache_dir)
+    finally:
+        _get_jinja_bytecode_cache.cache_clear()
+        _compile_template.cache_clear()
+
+
+def test_parse_meta_yaml_many(monkeypatch):
+    calls = []
+
+    def _parse(text, **kwargs):
+        calls.append((text, kwargs))
+        return {"text": text, **kwargs}
+
+    @contextlib.contextmanager
+    def _executor(kind, max_workers):
+        assert kind == "process"
+        assert max_workers == 2
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            yield pool
+
+    monkeypatch.setattr(conda_forge_tick.utils, "parse_meta_yaml", _parse)
+    monkeypatch.setattr(conda_forge_tick.utils, "executor", _executor)
+
+    texts = [f"text-{i}" for i in range(50)]
+    res = parse_meta_yaml_many(
+        texts,
+        max_workers=2,
+        chunksize=3,
+        for_pinning=True,
+        platform="linux",
+    )
+    assert res == [{"text": t, "for_pinning": True, "platform": "linux"} for t in texts]
+    assert len(calls) == len(texts)
+
+
+def _parse_in_worker(text, **kwargs):
+    # module level so that it pickles by reference into the worker processes
+    return {"text": text, "pid": os.getpid(), **kwargs}
+
+
+def test_parse_meta_yaml_many_processes(monkeypatch):
+    monkeypatch.setattr(conda_forge_tick.utils, "parse_meta_yaml", _parse_in_worker)
+
+    texts = [f"text-{i}" for i in range(20)]
+    res = parse_meta_yaml_many(texts, max_workers=2, chunksize=3, platform="linux")
+    assert [r["text"] for r in res] == texts
+    assert all(r["platform"] == "linux" for r in res)
+    assert os.getpid() not in {r["pid"] for r in res}
+
+
+def test_lazy_json_pickle_does_not_touch_disk(tmpdir):
+    f = os.path.join(tmpdir, "hi.json")
+    lj = LazyJson(f)
+    lj["hi"] = "world"
+    p = pickle.dumps(lj)
+    assert b"world" not in p
+
+    lj2 = pickle.loads(p)
+    assert lj2.file_name == f
+    assert lj2["hi"] == "world"
+
+    os.remove(f)
+    lj3 = pickle.loads(p)
+    assert lj3.file_name == f
+    assert not os.path.exists(f)
+
+
+def test_parse_meta_yaml_without_conda_build(monkeypatch):
+    monkeypatch.setattr(conda_forge_tick.utils, "conda_build", None)
+    with pytest.raises(ImportError, match="conda-build is required"):
+        conda_forge_tick.utils.parse_meta_yaml("package:\n  name: foo\n")
+
+
+def test_dumps_and_dump_defaults():
+    data = {"b": {"z", "y"}, "a": 1}
+    s = dumps(data)
+    assert s == rapidjson.dumps(
+        {"a": 1, "b": {"__set__": True, "elements": ["y", "z"]}},
+        indent=1,
+    )
+    assert dumps(data, sort_keys=False).startswith('{\n "b"')
+
+    buf = io.StringIO()
+    dump(data, buf)
+    assert buf.getvalue() == s